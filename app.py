@@ -3,13 +3,24 @@ Synapse-Architect: Neuro-Lab UI
 A Streamlit-based web app for tracing neural signal pathways.
 """
 
+import hashlib
+import json
+import string
+import time
+from pathlib import Path
 import streamlit as st
 import streamlit.components.v1 as components
 from brain_logic import (
     trace_neural_pathway,
+    prewarm_pathway_cache,
+    PRESET_STIMULI,
     validate_response,
+    InvalidPathwayError,
     extract_mermaid_chart,
     NCERT_REFERENCE,
+    RECEPTOR_MD,
+    BRAIN_REGIONS_MD,
+    NEURON_MD,
 )
 
 # ─── Page Config ───
@@ -21,174 +32,27 @@ st.set_page_config(
 )
 
 # ─── Custom CSS: Neuro-Lab Dark Mode + Neon Green ───
+# The stylesheet lives in assets/neuro.css and is inlined on every run.
+CSS_PATH = Path(__file__).parent / "assets" / "neuro.css"
+
 st.markdown(
-    """
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@300;400;600;700&display=swap');
-
-    :root {
-        --neon-green: #39FF14;
-        --dark-bg: #0a0a0a;
-        --card-bg: #1a1a2e;
-        --card-border: #39FF1440;
-        --text-primary: #e0e0e0;
-        --text-dim: #888888;
-    }
-
-    .stApp {
-        background-color: var(--dark-bg);
-        font-family: 'JetBrains Mono', monospace;
-    }
-
-    /* Header */
-    .neuro-header {
-        text-align: center;
-        padding: 2rem 0 1rem 0;
-        border-bottom: 2px solid var(--neon-green);
-        margin-bottom: 2rem;
-    }
-    .neuro-header h1 {
-        color: var(--neon-green);
-        font-size: 2.8rem;
-        font-weight: 700;
-        text-shadow: 0 0 20px #39FF1480, 0 0 40px #39FF1440;
-        margin-bottom: 0.3rem;
-        letter-spacing: 2px;
-    }
-    .neuro-header p {
-        color: var(--text-dim);
-        font-size: 1rem;
-    }
-
-    /* Step Cards */
-    .step-card {
-        background: var(--card-bg);
-        border: 1px solid var(--card-border);
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin: 0.75rem 0;
-        transition: all 0.3s ease;
-        position: relative;
-        overflow: hidden;
-    }
-    .step-card::before {
-        content: '';
-        position: absolute;
-        top: 0; left: 0;
-        width: 4px; height: 100%;
-        background: var(--neon-green);
-        border-radius: 4px 0 0 4px;
-    }
-    .step-card:hover {
-        border-color: var(--neon-green);
-        box-shadow: 0 0 15px #39FF1420;
-        transform: translateY(-2px);
-    }
-    .step-number {
-        display: inline-block;
-        background: var(--neon-green);
-        color: #0a0a0a;
-        font-weight: 700;
-        width: 32px; height: 32px;
-        line-height: 32px;
-        text-align: center;
-        border-radius: 50%;
-        margin-right: 0.75rem;
-        font-size: 0.9rem;
-    }
-    .step-title {
-        color: var(--neon-green);
-        font-size: 1.15rem;
-        font-weight: 600;
-        display: inline;
-    }
-    .step-desc {
-        color: var(--text-primary);
-        margin-top: 0.75rem;
-        line-height: 1.6;
-        font-size: 0.92rem;
-    }
-    .step-meta {
-        color: var(--text-dim);
-        font-size: 0.8rem;
-        margin-top: 0.5rem;
-        padding-top: 0.5rem;
-        border-top: 1px solid #ffffff10;
-    }
-
-    /* Accuracy Badge */
-    .accuracy-badge {
-        background: linear-gradient(135deg, #1a1a2e, #0a2a0a);
-        border: 1px solid var(--neon-green);
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-    }
-    .accuracy-badge h3 {
-        color: var(--neon-green);
-        margin-bottom: 0.75rem;
-    }
-
-    /* Sidebar styling */
-    section[data-testid="stSidebar"] {
-        background-color: #0d0d1a;
-        border-right: 1px solid var(--card-border);
-    }
-
-    /* Input styling */
-    .stTextInput input {
-        background-color: var(--card-bg) !important;
-        border: 1px solid var(--card-border) !important;
-        color: var(--neon-green) !important;
-        font-family: 'JetBrains Mono', monospace !important;
-        border-radius: 8px !important;
-        padding: 0.75rem !important;
-        font-size: 1.05rem !important;
-    }
-    .stTextInput input:focus {
-        border-color: var(--neon-green) !important;
-        box-shadow: 0 0 10px #39FF1430 !important;
-    }
-
-    /* Button */
-    .stButton > button {
-        background: linear-gradient(135deg, #39FF14, #20cc0e) !important;
-        color: #0a0a0a !important;
-        font-weight: 700 !important;
-        font-family: 'JetBrains Mono', monospace !important;
-        border: none !important;
-        border-radius: 8px !important;
-        padding: 0.6rem 2rem !important;
-        font-size: 1rem !important;
-        letter-spacing: 1px !important;
-        transition: all 0.3s ease !important;
-    }
-    .stButton > button:hover {
-        box-shadow: 0 0 20px #39FF1460 !important;
-        transform: scale(1.02);
-    }
-
-    /* Spinner */
-    .stSpinner > div {
-        border-top-color: var(--neon-green) !important;
-    }
-
-    /* Hide default Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-</style>
-""",
+    f"<style>\n{CSS_PATH.read_text(encoding='utf-8')}</style>",
     unsafe_allow_html=True,
 )
 
 
-def render_mermaid(mermaid_code: str, height: int = 450):
-    """Render a Mermaid.js flowchart using an HTML component."""
-    html = f"""
+# ESM build: only the core is fetched up front; the flowchart renderer is
+# pulled in as a lazy chunk the first time a graph is drawn.
+MERMAID_ESM_URL = "https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.esm.min.mjs"
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _mermaid_html(mermaid_code: str) -> str:
+    """Build (and memoize) the component document for a flowchart."""
+    return f"""
     <html>
     <head>
-        <script src="https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js"></script>
+        <link rel="modulepreload" href="{MERMAID_ESM_URL}">
         <style>
             body {{
                 background-color: #0a0a0a;
@@ -208,9 +72,10 @@ def render_mermaid(mermaid_code: str, height: int = 450):
         <pre class="mermaid">
 {mermaid_code}
         </pre>
-        <script>
+        <script type="module">
+            import mermaid from '{MERMAID_ESM_URL}';
             mermaid.initialize({{
-                startOnLoad: true,
+                startOnLoad: false,
                 theme: 'dark',
                 themeVariables: {{
                     primaryColor: '#1a1a2e',
@@ -225,22 +90,99 @@ def render_mermaid(mermaid_code: str, height: int = 450):
                     nodeTextColor: '#e0e0e0'
                 }}
             }});
+            await mermaid.run({{ querySelector: '.mermaid' }});
         </script>
     </body>
     </html>
     """
-    components.html(html, height=height, scrolling=True)
+
+
+def render_mermaid(mermaid_code: str, height: int = 450):
+    """Render a Mermaid.js flowchart using an HTML component."""
+    components.html(_mermaid_html(mermaid_code), height=height, scrolling=True)
+
+
+STEP_CARD_TEMPLATE = string.Template(
+    """<div class="step-card">
+    <span class="step-number">$step_number</span>
+    <span class="step-title">$title</span>
+    <div class="step-desc">$description</div>
+    <div class="step-meta">
+        🏗️ <strong>Structure:</strong> $structure
+        &nbsp;&nbsp;|&nbsp;&nbsp;
+        📖 <strong>NCERT:</strong> $ncert_reference
+    </div>
+</div>"""
+)
+
+FEATURE_CARD_TEMPLATE = string.Template(
+    """<div class="step-card" style="text-align:center; padding:2rem;">
+    <div style="font-size:2.5rem; margin-bottom:0.75rem;">$icon</div>
+    <div class="step-title" style="display:block; font-size:1.1rem;">$title</div>
+    <div class="step-desc" style="font-size:0.85rem;">$desc</div>
+</div>"""
+)
+
+
+def step_card_html(step: dict) -> str:
+    """Build the HTML card for a single pathway step."""
+    return STEP_CARD_TEMPLATE.substitute(
+        step_number=step.get("step_number", "?"),
+        title=step.get("title", "Untitled"),
+        description=step.get("description", ""),
+        structure=step.get("structure", "N/A"),
+        ncert_reference=step.get("ncert_reference", "N/A"),
+    )
+
+
+def steps_html(steps: list) -> str:
+    """Concatenate all step cards so they ship as a single element."""
+    return "".join(step_card_html(step) for step in steps)
+
+
+_FEATURES = (
+    ("🧬", "5-Step Reasoning", "Traces the neural signal from receptor to cortex in exactly 5 logical, NCERT-aligned steps."),
+    ("📊", "Live Flowchart", "Generates a real-time Mermaid.js neural circuit diagram with dark-mode neon styling."),
+    ("✅", "NCERT Grounded", "Every pathway is cross-checked against NCERT Class 10-12 biology standards."),
+)
+
+
+@st.cache_resource
+def _landing_html() -> str:
+    """Static landing-page feature grid, built once per process."""
+    cards = "".join(
+        FEATURE_CARD_TEMPLATE.substitute(icon=icon, title=title, desc=desc)
+        for icon, title, desc in _FEATURES
+    )
+    return f'<div class="feature-grid">{cards}</div>'
+
+
+def result_fingerprint(result: dict) -> str:
+    """Stable id for a trace result, used to key the per-result caches below."""
+    payload = json.dumps(result, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+# Keyed on the fingerprint only (underscore args are not hashed), so reruns
+# triggered by unrelated widgets reuse the output without rebuilding it.
+@st.cache_data(max_entries=64, show_spinner=False)
+def _cards_html(result_id: str, _steps: list) -> str:
+    return steps_html(_steps)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _cached_mermaid(result_id: str, _result: dict) -> str:
+    return extract_mermaid_chart(_result)
 
 
 # ─── Header ───
-st.markdown(
+st.html(
     """
 <div class="neuro-header">
     <h1>🧠 SYNAPSE-ARCHITECT</h1>
     <p>Autonomous Neuro-Reasoning Agent &nbsp;|&nbsp; NCERT-Grounded &nbsp;|&nbsp; Real-Time Visualization</p>
 </div>
-""",
-    unsafe_allow_html=True,
+"""
 )
 
 # ─── Sidebar ───
@@ -249,16 +191,8 @@ with st.sidebar:
     st.markdown("---")
 
     st.markdown("### 📡 Quick Stimuli")
-    example_stimuli = [
-        "Stubbing a toe",
-        "Touching a hot pan",
-        "Seeing a bright flash",
-        "Hearing a loud bang",
-        "Smelling fresh coffee",
-        "Tasting something sour",
-        "Stepping on a sharp object",
-        "Feeling a cold breeze",
-    ]
+    example_stimuli = list(PRESET_STIMULI)
+    prewarm_pathway_cache()
 
     selected_example = st.selectbox(
         "Choose a pre-set stimulus:",
@@ -268,16 +202,13 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### 📚 NCERT Reference")
     with st.expander("Receptor Types"):
-        for name, desc in NCERT_REFERENCE["receptor_types"].items():
-            st.markdown(f"**{name}**: {desc}")
+        st.markdown(RECEPTOR_MD)
 
     with st.expander("Brain Regions"):
-        for name, desc in NCERT_REFERENCE["key_brain_regions"].items():
-            st.markdown(f"**{name}**: {desc}")
+        st.markdown(BRAIN_REGIONS_MD)
 
     with st.expander("Neuron Types"):
-        for name, desc in NCERT_REFERENCE["neuron_types"].items():
-            st.markdown(f"**{name}**: {desc}")
+        st.markdown(NEURON_MD)
 
     st.markdown("---")
     st.markdown(
@@ -304,32 +235,59 @@ with col_btn:
 
 # ─── Run Agent ───
 if trace_btn and stimulus:
-    with st.spinner("🧠 Neural pathway analysis in progress..."):
-        try:
-            result = trace_neural_pathway(stimulus)
-            validation = validate_response(result)
-
-            if not validation["valid"]:
-                st.error(
-                    "⚠️ Response validation failed: "
-                    + "; ".join(validation["errors"])
-                )
-                st.json(result)
-            else:
-                # Store in session for persistence
-                st.session_state["result"] = result
-                st.session_state["validation"] = validation
-
-        except Exception as e:
-            st.error(f"❌ Error during neural trace: {str(e)}")
-            st.info(
-                "💡 Make sure your GITHUB_TOKEN is set in "
-                ".streamlit/secrets.toml"
-            )
+    # Step cards are drawn here as they stream in, then replaced by the
+    # full results view below
+    status = st.empty()
+    status.caption("🧠 Neural pathway analysis in progress...")
+    live = st.empty()
+    streamed_cards = []
+    trace_started = time.monotonic()
+    shown_elapsed = [0]
+
+    def show_streamed_step(step: dict):
+        streamed_cards.append(step_card_html(step))
+        live.html("".join(streamed_cards))
+
+    def show_elapsed():
+        # At most one update per second; each update is also the point where
+        # Streamlit can honor a Stop or rerun request.
+        elapsed = int(time.monotonic() - trace_started)
+        if elapsed != shown_elapsed[0]:
+            shown_elapsed[0] = elapsed
+            status.caption(f"🧠 Neural pathway analysis in progress... {elapsed}s")
+
+    try:
+        result = trace_neural_pathway(
+            stimulus, on_step=show_streamed_step, on_wait=show_elapsed
+        )
+        validation = validate_response(result)
+
+        # Store in session for persistence
+        st.session_state["result"] = result
+        st.session_state["result_id"] = result_fingerprint(result)
+        st.session_state["validation"] = validation
+
+    except InvalidPathwayError as e:
+        st.error(
+            "⚠️ Response validation failed: "
+            + "; ".join(e.report["errors"])
+        )
+        st.json(e.result)
+
+    except Exception as e:
+        st.error(f"❌ Error during neural trace: {str(e)}")
+        st.info(
+            "💡 Make sure your GITHUB_TOKEN is set in "
+            ".streamlit/secrets.toml"
+        )
+
+    status.empty()
+    live.empty()
 
 # ─── Display Results ───
 if "result" in st.session_state:
     result = st.session_state["result"]
+    result_id = st.session_state["result_id"]
     validation = st.session_state["validation"]
 
     st.markdown("---")
@@ -343,22 +301,7 @@ if "result" in st.session_state:
         st.markdown(
             f"### Signal Trace: *{result.get('stimulus', stimulus)}*"
         )
-        for step in result.get("steps", []):
-            st.markdown(
-                f"""
-            <div class="step-card">
-                <span class="step-number">{step.get('step_number', '?')}</span>
-                <span class="step-title">{step.get('title', 'Untitled')}</span>
-                <div class="step-desc">{step.get('description', '')}</div>
-                <div class="step-meta">
-                    🏗️ <strong>Structure:</strong> {step.get('structure', 'N/A')}
-                    &nbsp;&nbsp;|&nbsp;&nbsp;
-                    📖 <strong>NCERT:</strong> {step.get('ncert_reference', 'N/A')}
-                </div>
-            </div>
-            """,
-                unsafe_allow_html=True,
-            )
+        st.html(_cards_html(result_id, result.get("steps", [])))
 
         if result.get("reflex_arc_note"):
             st.markdown("---")
@@ -366,14 +309,14 @@ if "result" in st.session_state:
 
     with tab_flowchart:
         st.markdown("### 📊 Neural Circuit Flowchart")
-        mermaid_code = extract_mermaid_chart(result)
+        mermaid_code = _cached_mermaid(result_id, result)
         render_mermaid(mermaid_code, height=500)
 
         with st.expander("📝 View Mermaid Source Code"):
             st.code(mermaid_code, language="mermaid")
 
     with tab_accuracy:
-        st.markdown(
+        st.html(
             f"""
         <div class="accuracy-badge">
             <h3>✅ NCERT Accuracy Cross-Check</h3>
@@ -381,8 +324,7 @@ if "result" in st.session_state:
                 {result.get('ncert_accuracy_notes', 'No accuracy notes generated.')}
             </p>
         </div>
-        """,
-            unsafe_allow_html=True,
+        """
         )
 
         # Validation report
@@ -398,21 +340,4 @@ if "result" in st.session_state:
 elif not trace_btn:
     # Landing state
     st.markdown("---")
-    cols = st.columns(3)
-    features = [
-        ("🧬", "5-Step Reasoning", "Traces the neural signal from receptor to cortex in exactly 5 logical, NCERT-aligned steps."),
-        ("📊", "Live Flowchart", "Generates a real-time Mermaid.js neural circuit diagram with dark-mode neon styling."),
-        ("✅", "NCERT Grounded", "Every pathway is cross-checked against NCERT Class 10-12 biology standards."),
-    ]
-    for col, (icon, title, desc) in zip(cols, features):
-        with col:
-            st.markdown(
-                f"""
-            <div class="step-card" style="text-align:center; padding:2rem;">
-                <div style="font-size:2.5rem; margin-bottom:0.75rem;">{icon}</div>
-                <div class="step-title" style="display:block; font-size:1.1rem;">{title}</div>
-                <div class="step-desc" style="font-size:0.85rem;">{desc}</div>
-            </div>
-            """,
-                unsafe_allow_html=True,
-            )
+    st.html(_landing_html())
@@ -4,97 +4,140 @@ Traces neural signal pathways from stimulus to cortex in 5 logical steps,
 generates Mermaid.js flowcharts, and cross-checks against NCERT biology standards.
 """
 
+import functools
+import hashlib
+import itertools
 import json
+import queue
 import re
+import threading
+from concurrent.futures import Future
+from types import MappingProxyType
 import streamlit as st
 from azure.ai.inference import ChatCompletionsClient
 from azure.ai.inference.models import SystemMessage, UserMessage
 from azure.core.credentials import AzureKeyCredential
 
-# --- GitHub Models API setup ---
-GITHUB_MODELS_ENDPOINT = "https://models.inference.ai.azure.com"
+# orjson parses several times faster than the stdlib; its JSONDecodeError
+# subclasses json.JSONDecodeError, so the except clauses below cover both.
+try:
+    import orjson
 
-client = ChatCompletionsClient(
-    endpoint=GITHUB_MODELS_ENDPOINT,
-    credential=AzureKeyCredential(st.secrets["GITHUB_TOKEN"]),
-)
-
-NCERT_REFERENCE = {
-    "receptor_types": {
-        "nociceptors": "Pain receptors in skin/tissue detecting harmful stimuli",
-        "thermoreceptors": "Detect temperature changes (hot/cold)",
-        "photoreceptors": "Rods and cones in retina detecting light",
-        "mechanoreceptors": "Detect pressure, touch, vibration",
-        "chemoreceptors": "Detect chemical stimuli (taste, smell)",
-        "proprioceptors": "Detect body position and movement",
-    },
-    "neuron_types": {
-        "sensory_neuron": "Afferent neuron carrying signals from receptor to CNS",
-        "motor_neuron": "Efferent neuron carrying signals from CNS to effector",
-        "interneuron": "Relay neuron within CNS connecting sensory and motor neurons",
-    },
-    "signal_pathway_components": [
-        "Receptor/Sense Organ",
-        "Sensory (Afferent) Neuron",
-        "Spinal Cord / Brain Stem (CNS Relay)",
-        "Interneuron / Relay Neuron",
-        "Brain Region (Processing Center)",
-    ],
-    "key_brain_regions": {
-        "somatosensory_cortex": "Processes touch, pain, temperature (parietal lobe)",
-        "motor_cortex": "Initiates voluntary movement (frontal lobe)",
-        "visual_cortex": "Processes visual information (occipital lobe)",
-        "auditory_cortex": "Processes sound (temporal lobe)",
-        "cerebellum": "Coordinates balance and fine motor control",
-        "hypothalamus": "Regulates temperature, hunger, thirst",
-        "medulla_oblongata": "Controls involuntary functions (breathing, heart rate)",
-    },
-    "signal_transmission": {
-        "synapse": "Junction between two neurons; signal crosses via neurotransmitters",
-        "neurotransmitters": "Chemical messengers (e.g., acetylcholine, dopamine)",
-        "action_potential": "Electrical impulse traveling along the axon",
-        "reflex_arc": "Rapid involuntary response pathway bypassing the brain",
-    },
-    "ncert_chapters": [
-        "Class 10 Ch.7: Control and Coordination",
-        "Class 11 Ch.21: Neural Control and Coordination",
-        "Class 12 Ch.4: Human Neural System (reference)",
-    ],
-}
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
+# --- GitHub Models API setup ---
+GITHUB_MODELS_ENDPOINT = "https://models.inference.ai.azure.com"
+MODEL_NAME = "gpt-4o"
 
-def get_ncert_context() -> str:
-    """Serialize the NCERT reference data into an LLM-friendly string."""
-    lines = ["=== NCERT BIOLOGY REFERENCE DATA ==="]
 
-    lines.append("\n## Receptor Types:")
-    for key, val in NCERT_REFERENCE["receptor_types"].items():
-        lines.append(f"  - {key}: {val}")
+@st.cache_resource(show_spinner=False)
+def get_client() -> ChatCompletionsClient:
+    """Shared inference client, reused across reruns and sessions."""
+    return ChatCompletionsClient(
+        endpoint=GITHUB_MODELS_ENDPOINT,
+        credential=AzureKeyCredential(st.secrets["GITHUB_TOKEN"]),
+    )
 
-    lines.append("\n## Neuron Types:")
-    for key, val in NCERT_REFERENCE["neuron_types"].items():
-        lines.append(f"  - {key}: {val}")
 
-    lines.append("\n## Standard Signal Pathway Components (5-step model):")
-    for i, comp in enumerate(NCERT_REFERENCE["signal_pathway_components"], 1):
-        lines.append(f"  Step {i}: {comp}")
+NCERT_REFERENCE = MappingProxyType(
+    {
+        "receptor_types": MappingProxyType(
+            {
+                "nociceptors": "Pain receptors in skin/tissue detecting harmful stimuli",
+                "thermoreceptors": "Detect temperature changes (hot/cold)",
+                "photoreceptors": "Rods and cones in retina detecting light",
+                "mechanoreceptors": "Detect pressure, touch, vibration",
+                "chemoreceptors": "Detect chemical stimuli (taste, smell)",
+                "proprioceptors": "Detect body position and movement",
+            }
+        ),
+        "neuron_types": MappingProxyType(
+            {
+                "sensory_neuron": "Afferent neuron carrying signals from receptor to CNS",
+                "motor_neuron": "Efferent neuron carrying signals from CNS to effector",
+                "interneuron": "Relay neuron within CNS connecting sensory and motor neurons",
+            }
+        ),
+        "signal_pathway_components": (
+            "Receptor/Sense Organ",
+            "Sensory (Afferent) Neuron",
+            "Spinal Cord / Brain Stem (CNS Relay)",
+            "Interneuron / Relay Neuron",
+            "Brain Region (Processing Center)",
+        ),
+        "key_brain_regions": MappingProxyType(
+            {
+                "somatosensory_cortex": "Processes touch, pain, temperature (parietal lobe)",
+                "motor_cortex": "Initiates voluntary movement (frontal lobe)",
+                "visual_cortex": "Processes visual information (occipital lobe)",
+                "auditory_cortex": "Processes sound (temporal lobe)",
+                "cerebellum": "Coordinates balance and fine motor control",
+                "hypothalamus": "Regulates temperature, hunger, thirst",
+                "medulla_oblongata": "Controls involuntary functions (breathing, heart rate)",
+            }
+        ),
+        "signal_transmission": MappingProxyType(
+            {
+                "synapse": "Junction between two neurons; signal crosses via neurotransmitters",
+                "neurotransmitters": "Chemical messengers (e.g., acetylcholine, dopamine)",
+                "action_potential": "Electrical impulse traveling along the axon",
+                "reflex_arc": "Rapid involuntary response pathway bypassing the brain",
+            }
+        ),
+        "ncert_chapters": (
+            "Class 10 Ch.7: Control and Coordination",
+            "Class 11 Ch.21: Neural Control and Coordination",
+            "Class 12 Ch.4: Human Neural System (reference)",
+        ),
+    }
+)
 
-    lines.append("\n## Key Brain Regions:")
-    for key, val in NCERT_REFERENCE["key_brain_regions"].items():
-        lines.append(f"  - {key}: {val}")
 
-    lines.append("\n## Signal Transmission Concepts:")
-    for key, val in NCERT_REFERENCE["signal_transmission"].items():
-        lines.append(f"  - {key}: {val}")
+# Pre-rendered Markdown for the sidebar reference expanders (one element each)
+RECEPTOR_MD = "\n\n".join(
+    f"**{name}**: {desc}" for name, desc in NCERT_REFERENCE["receptor_types"].items()
+)
+BRAIN_REGIONS_MD = "\n\n".join(
+    f"**{name}**: {desc}"
+    for name, desc in NCERT_REFERENCE["key_brain_regions"].items()
+)
+NEURON_MD = "\n\n".join(
+    f"**{name}**: {desc}" for name, desc in NCERT_REFERENCE["neuron_types"].items()
+)
 
-    lines.append("\n## NCERT Chapter References:")
-    for ch in NCERT_REFERENCE["ncert_chapters"]:
-        lines.append(f"  - {ch}")
 
-    return "\n".join(lines)
+@functools.lru_cache(maxsize=1)
+def get_ncert_context() -> str:
+    """Serialize the NCERT reference data into an LLM-friendly string."""
+    ref = NCERT_REFERENCE
+    return "\n".join(
+        itertools.chain(
+            ["=== NCERT BIOLOGY REFERENCE DATA ==="],
+            ["\n## Receptor Types:"],
+            (f"  - {key}: {val}" for key, val in ref["receptor_types"].items()),
+            ["\n## Neuron Types:"],
+            (f"  - {key}: {val}" for key, val in ref["neuron_types"].items()),
+            ["\n## Standard Signal Pathway Components (5-step model):"],
+            (
+                f"  Step {i}: {comp}"
+                for i, comp in enumerate(ref["signal_pathway_components"], 1)
+            ),
+            ["\n## Key Brain Regions:"],
+            (f"  - {key}: {val}" for key, val in ref["key_brain_regions"].items()),
+            ["\n## Signal Transmission Concepts:"],
+            (f"  - {key}: {val}" for key, val in ref["signal_transmission"].items()),
+            ["\n## NCERT Chapter References:"],
+            (f"  - {ch}" for ch in ref["ncert_chapters"]),
+        )
+    )
 
 
-SYSTEM_PROMPT = f"""You are Synapse-Architect, a neuroscience reasoning agent for students.
+@functools.cache
+def _build_prompt() -> str:
+    """Assemble the system prompt once per process."""
+    return f"""You are Synapse-Architect, a neuroscience reasoning agent for students.
 
 Your task: Given a stimulus, trace the complete neural signal pathway in EXACTLY 5 logical steps,
 from the receptor to the brain's processing center.
@@ -132,33 +175,127 @@ Rules:
 """
 
 
+SYSTEM_PROMPT = _build_prompt()
+
+# Built once and reused so every request shares a byte-identical prefix,
+# which lets the endpoint's automatic prompt caching kick in.
+_SYSTEM_MSG = SystemMessage(content=SYSTEM_PROMPT)
+
+# Part of the trace cache key: disk-persisted entries never expire, so any
+# change to the prompt or model must produce a fresh key.
+_PROMPT_VERSION = hashlib.sha1(
+    f"{MODEL_NAME}\n{SYSTEM_PROMPT}".encode("utf-8")
+).hexdigest()[:16]
+
+
+class InvalidPathwayError(ValueError):
+    """Raised when a parsed model response fails ``validate_response``."""
+
+    def __init__(self, result: dict, report: dict):
+        super().__init__(
+            "Response validation failed: " + "; ".join(report["errors"])
+        )
+        self.result = result
+        self.report = report
+
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*([\s\S]*?)```")
+
+
 def _extract_json(text: str) -> dict:
     """Parse JSON from the LLM response, handling markdown fences if present."""
-    # Try direct parse first
+    # Try direct parse first, unless the text is obviously fenced
     text = text.strip()
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
+    if not text.startswith("```"):
+        try:
+            return _loads(text)
+        except json.JSONDecodeError:
+            pass
 
     # Strip markdown ```json ... ``` fences if the model wrapped them
-    match = re.search(r"```(?:json)?\s*([\s\S]*?)```", text)
-    if match:
-        return json.loads(match.group(1).strip())
+    if "```" in text:
+        match = _FENCE_RE.search(text)
+        if match:
+            return _loads(match.group(1).strip())
 
     raise ValueError("Could not parse JSON from model response")
 
 
-def trace_neural_pathway(stimulus: str) -> dict:
+_STEPS_ARRAY_RE = re.compile(r'"steps"\s*:\s*\[')
+
+
+class _StepStreamParser:
     """
-    Main agent function: takes a stimulus string and returns
-    a structured neural pathway trace with 5 steps, a Mermaid chart,
-    and NCERT grounding notes.
+    Incrementally pulls completed ``steps[i]`` objects out of a JSON
+    document that arrives in chunks, so each step can be shown as soon as
+    its closing brace streams in. Scans every character once.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._in_steps = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start = 0
+
+    def feed(self, chunk: str) -> list:
+        """Append a chunk and return any steps completed by it."""
+        self.text += chunk
+        completed = []
+        if self._done:
+            return completed
+
+        if not self._in_steps:
+            match = _STEPS_ARRAY_RE.search(self.text)
+            if not match:
+                return completed
+            self._in_steps = True
+            self._pos = match.end()
+
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._obj_start = i
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        completed.append(_loads(text[self._obj_start : i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+            elif ch == "]" and self._depth == 0:
+                self._done = True
+                break
+        self._pos = len(text)
+        return completed
+
+
+def _query_pathway(stimulus: str, on_step=None) -> dict:
     """
+    Stream the model's answer for a (normalized) stimulus. ``on_step``
+    receives each step as it completes; it must not touch Streamlit elements
+    when called from a cached function (they would be recorded for replay).
+    """
+    client = get_client()
     response = client.complete(
-        model="gpt-4o",
+        model=MODEL_NAME,
         messages=[
-            SystemMessage(content=SYSTEM_PROMPT),
+            _SYSTEM_MSG,
             UserMessage(
                 content=(
                     f"Trace the complete neural signal pathway for this stimulus: "
@@ -169,13 +306,168 @@ def trace_neural_pathway(stimulus: str) -> dict:
         ],
         temperature=0.3,
         max_tokens=2000,
+        stream=True,
     )
 
-    raw = response.choices[0].message.content
-    result = _extract_json(raw)
+    parser = _StepStreamParser()
+    for update in response:
+        if not update.choices or not update.choices[0].delta.content:
+            continue
+        for step in parser.feed(update.choices[0].delta.content):
+            if on_step is not None:
+                on_step(step)
+
+    result = _extract_json(parser.text)
+    # Raise instead of returning: st.cache_data does not store exceptions, so
+    # a bad answer is never cached and the next TRACE asks the model again.
+    report = validate_response(result)
+    if not report["valid"]:
+        raise InvalidPathwayError(result, report)
     return result
 
 
+PRESET_STIMULI = (
+    "Stubbing a toe",
+    "Touching a hot pan",
+    "Seeing a bright flash",
+    "Hearing a loud bang",
+    "Smelling fresh coffee",
+    "Tasting something sour",
+    "Stepping on a sharp object",
+    "Feeling a cold breeze",
+)
+_PRESET_KEYS = frozenset(stimulus.strip().lower() for stimulus in PRESET_STIMULI)
+
+
+# Only the presets are persisted. Streamlit never deletes disk entries
+# (``max_entries`` bounds the in-memory layer only) and ignores ``ttl`` for
+# them, so persisting free text would grow ~/.streamlit/cache without limit.
+# Each prompt/model change still leaves the old presets' files behind there.
+@st.cache_data(persist="disk", show_spinner=False)
+def _trace_preset_cached(
+    stimulus: str, prompt_version: str, _on_step=None
+) -> dict:
+    """Disk-persisted trace of one of ``PRESET_STIMULI``."""
+    return _query_pathway(stimulus, _on_step)
+
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _trace_adhoc_cached(
+    stimulus: str, prompt_version: str, _on_step=None
+) -> dict:
+    """In-memory trace of a free-text stimulus."""
+    return _query_pathway(stimulus, _on_step)
+
+
+def _trace_cached(stimulus: str, on_step=None) -> dict:
+    """
+    Trace a normalized stimulus through the matching cache. The key includes
+    ``_PROMPT_VERSION``; ``on_step`` is not part of it and is never called
+    on a cache hit.
+    """
+    if stimulus in _PRESET_KEYS:
+        return _trace_preset_cached(stimulus, _PROMPT_VERSION, on_step)
+    return _trace_adhoc_cached(stimulus, _PROMPT_VERSION, on_step)
+
+
+# How often the streaming wait loop wakes up to call ``on_wait``
+_POLL_INTERVAL = 0.25
+
+
+# Streaming traces currently running in this process, keyed by normalized
+# stimulus. Entries outlive the script run that started them (a rerun does
+# not stop the worker) and are removed when the worker's future completes.
+_INFLIGHT: dict = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def _start_trace(stimulus: str, on_step) -> Future:
+    """Run the cached trace on its own daemon thread (one per call, no cap)."""
+    future = Future()
+
+    def _run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(_trace_cached(stimulus, on_step))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=_run, name="pathway-trace", daemon=True).start()
+    return future
+
+
+def _discard_inflight(stimulus: str):
+    with _INFLIGHT_LOCK:
+        _INFLIGHT.pop(stimulus, None)
+
+
+def trace_neural_pathway(stimulus: str, on_step=None, on_wait=None) -> dict:
+    """
+    Main agent function: takes a stimulus string and returns
+    a structured neural pathway trace with 5 steps, a Mermaid chart,
+    and NCERT grounding notes.
+
+    If ``on_step`` is given, it is called with each step dict as the
+    response streams in, and ``on_wait`` (optional) every ``_POLL_INTERVAL``
+    seconds while no step is ready. Both run on the calling thread, so they
+    may update the UI — which also gives Streamlit a chance to act on a
+    Stop or rerun request while the model is still thinking.
+    """
+    # Normalize so "Stubbing a toe" and "stubbing a toe " share a cache slot
+    stimulus = stimulus.strip().lower()
+    if on_step is None:
+        return _trace_cached(stimulus)
+
+    # The cached call runs on a worker and hands steps back through a queue,
+    # keeping Streamlit calls out of the cached function. If this script run
+    # is interrupted, the worker still finishes and fills the cache.
+    #
+    # A repeat request for a stimulus that is still being traced (double
+    # click, rerun mid-call, another session) joins the running future
+    # instead of issuing a second model call; it just gets no streamed steps.
+    steps = queue.Queue()
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(stimulus)
+        started = future is None
+        if started:
+            future = _start_trace(stimulus, steps.put)
+            _INFLIGHT[stimulus] = future
+    if started:
+        # Outside the lock: the callback runs inline if already done
+        future.add_done_callback(lambda _, key=stimulus: _discard_inflight(key))
+    while not future.done() or not steps.empty():
+        try:
+            on_step(steps.get(timeout=_POLL_INTERVAL))
+        except queue.Empty:
+            if on_wait is not None:
+                on_wait()
+    return future.result()
+
+
+@st.cache_resource(show_spinner=False)
+def prewarm_pathway_cache() -> threading.Thread:
+    """Trace ``PRESET_STIMULI`` in a background thread, once per process."""
+
+    def _warm():
+        for stimulus in PRESET_STIMULI:
+            try:
+                trace_neural_pathway(stimulus)
+            except Exception:
+                # Best-effort: a failed preset is simply traced on demand later
+                pass
+
+    thread = threading.Thread(target=_warm, name="pathway-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+# Schema order (used for messages) plus frozensets for the fast subset check
+_REQUIRED_KEYS = ("stimulus", "steps", "mermaid_flowchart", "ncert_accuracy_notes")
+_STEP_KEYS = ("step_number", "title", "description", "structure", "ncert_reference")
+_REQUIRED_KEY_SET = frozenset(_REQUIRED_KEYS)
+_STEP_KEY_SET = frozenset(_STEP_KEYS)
+
+
 def validate_response(result: dict) -> dict:
     """
     Validates the LLM response structure and returns a validation report.
@@ -183,16 +475,13 @@ def validate_response(result: dict) -> dict:
     report = {"valid": True, "errors": [], "warnings": []}
 
     # Check required keys
-    required_keys = [
-        "stimulus",
-        "steps",
-        "mermaid_flowchart",
-        "ncert_accuracy_notes",
-    ]
-    for key in required_keys:
-        if key not in result:
-            report["valid"] = False
-            report["errors"].append(f"Missing required key: '{key}'")
+    if not _REQUIRED_KEY_SET <= result.keys():
+        report["valid"] = False
+        report["errors"].extend(
+            f"Missing required key: '{key}'"
+            for key in _REQUIRED_KEYS
+            if key not in result
+        )
 
     # Check steps count
     steps = result.get("steps", [])
@@ -201,19 +490,13 @@ def validate_response(result: dict) -> dict:
         report["errors"].append(f"Expected 5 steps, got {len(steps)}")
 
     # Check each step structure
-    step_keys = [
-        "step_number",
-        "title",
-        "description",
-        "structure",
-        "ncert_reference",
-    ]
     for i, step in enumerate(steps):
-        for key in step_keys:
-            if key not in step:
-                report["warnings"].append(
-                    f"Step {i + 1} missing key: '{key}'"
-                )
+        if not _STEP_KEY_SET <= step.keys():
+            report["warnings"].extend(
+                f"Step {i + 1} missing key: '{key}'"
+                for key in _STEP_KEYS
+                if key not in step
+            )
 
     # Check Mermaid syntax starts correctly
     mermaid = result.get("mermaid_flowchart", "")
@@ -225,9 +508,13 @@ def validate_response(result: dict) -> dict:
     return report
 
 
+_DEFAULT_MERMAID = "graph TD\n  A[No data] --> B[Error]"
+
+
 def extract_mermaid_chart(result: dict) -> str:
     """Extract and sanitize the Mermaid flowchart from the result."""
-    mermaid = result.get("mermaid_flowchart", "graph TD\n  A[No data] --> B[Error]")
-    # Clean up any escaped newlines
-    mermaid = mermaid.replace("\\n", "\n")
+    mermaid = result.get("mermaid_flowchart") or _DEFAULT_MERMAID
+    # Clean up any escaped newlines (most responses already use real ones)
+    if "\\n" in mermaid:
+        mermaid = mermaid.replace("\\n", "\n")
     return mermaid